@@ -0,0 +1,192 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from difflib import SequenceMatcher
+from cache import count_lookup
+
+# Only general coffee knowledge is cached; place, detail and news answers depend on where and when
+CACHEABLE_ROUTES = {"no_tool"}
+
+SIMILARITY_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.85))
+ANSWER_TTL = float(os.environ.get("ANSWER_CACHE_TTL", 7 * 24 * 3600))
+MAX_ANSWERS = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 2000))
+
+# Questions that mention time or location are never served from the cache, whatever their route
+_SENSITIVE = re.compile(
+    r"\b(today|tonight|now|currently|current|latest|newest|recent|recently|this (week|month|year)|"
+    r"near|nearby|around|here|open|price|prices|20\d\d)\b"
+)
+
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "be", "to", "of", "and", "or", "in", "on", "for", "with",
+    "what", "whats", "how", "why", "which", "do", "does", "can", "i", "me", "my", "you", "your",
+    "it", "its", "about", "some", "any", "s", "tell", "please", "between", "at",
+    # Modal and filler words that rephrasings swap freely
+    "should", "could", "would", "will", "shall", "might", "must", "much", "many", "get", "make", "made",
+    "just", "really", "actually", "there", "way", "ways", "best", "good", "know", "want", "need", "explain",
+    # Nearly every question mentions them, so they carry no signal; real modifiers (decaf, iced, concentrate) stay
+    "coffee", "bean", "beans", "home",
+}
+
+# Comparisons whose answer flips when the two sides are swapped
+_ORDERED = re.compile(r"\b(than|rather|instead|vs|versus)\b")
+
+def content_words(text: str):
+    return [w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in _STOPWORDS]
+
+def stem(word: str) -> str:
+    """Crude suffix stripping so plurals and word forms match: "lattes" -> "latte", "difference" -> "differ"."""
+    for suffix in ("ences", "ence", "ings", "ing", "ed", "s"):
+        if word.endswith(suffix) and not word.endswith("ss") and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+def _same_word(a: str, b: str) -> bool:
+    # Word forms ("differ", "difference") and one-letter typos ("expresso") still count as the same word
+    a, b = stem(a), stem(b)
+    return a == b or (min(len(a), len(b)) >= 4 and SequenceMatcher(None, a, b).ratio() >= 0.85)
+
+def same_terms(a: str, b: str) -> bool:
+    """Whether two questions use the same content words, in the same order when they compare two things.
+
+    A cosine over bags of words can't tell a modifier or a swapped comparison apart from a rephrasing:
+
+    >>> same_terms("How much caffeine is in a latte?", "How much caffeine is in lattes")
+    True
+    >>> same_terms("How much caffeine is in a decaf latte?", "How much caffeine is in a latte?")
+    False
+    >>> same_terms("Is drip stronger than espresso?", "Is espresso stronger than drip?")
+    False
+    >>> same_terms("How do I make cold brew concentrate?", "How do I make cold brew?")
+    False
+    >>> same_terms("Difference between arabica and robusta?", "What's the difference between robusta and arabica")
+    True
+
+    Modal and filler words and a few words nearly every question has ("coffee beans", "at home") don't count:
+
+    >>> same_terms("How should I dial in espresso at home?", "How do I dial in espresso at home?")
+    True
+    >>> same_terms("Difference between Arabica and Robusta?", "What's the difference between Arabica and Robusta coffee beans?")
+    True
+    >>> same_terms("How do Arabica and Robusta differ?", "What's the difference between Arabica and Robusta coffee beans?")
+    True
+    >>> same_terms("How do I make an iced latte?", "How do I make a latte?")
+    False
+    """
+    a_terms = list(dict.fromkeys(content_words(a)))
+    b_terms = list(dict.fromkeys(content_words(b)))
+    if len(a_terms) != len(b_terms):
+        return False
+    if _ORDERED.search(a.lower()) or _ORDERED.search(b.lower()):
+        return all(_same_word(x, y) for x, y in zip(a_terms, b_terms))
+    unmatched = list(b_terms)
+    for term in a_terms:
+        match = next((other for other in unmatched if _same_word(term, other)), None)
+        if match is None:
+            return False
+        unmatched.remove(match)
+    return True
+
+def vectorize(text: str) -> Counter:
+    """Sparse vector of stemmed content words (weighted double) and their character trigrams, which absorb typos."""
+    vector = Counter()
+    for word in map(stem, content_words(text)):
+        vector[word] += 2
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            vector["#" + padded[i:i + 3]] += 1
+    return vector
+
+def cosine(a: Counter, a_norm: float, b: Counter, b_norm: float) -> float:
+    if not a_norm or not b_norm:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(count * b.get(key, 0) for key, count in a.items()) / (a_norm * b_norm)
+
+def is_cacheable(question: str, route: str) -> bool:
+    return route in CACHEABLE_ROUTES and not _SENSITIVE.search(question.lower())
+
+class AnswerCache:
+    """Shared in-process cache of finished answers, matched on question similarity.
+
+    Near-duplicate phrasings hit the same entry when they share the same content words (see
+    `same_terms`) and their cosine similarity reaches the threshold. Entries expire after the TTL and the least recently used ones are evicted.
+    """
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, ttl: float = ANSWER_TTL, max_entries: int = MAX_ANSWERS):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # normalized question -> entry, least recently used first
+        self._postings = {}  # stemmed content word -> normalized questions containing it
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(question: str) -> str:
+        return " ".join(question.lower().split())
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        for word in entry["words"]:
+            keys = self._postings.get(word)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[word]
+
+    def get(self, question: str):
+        """Return the cached answer of the most similar question, or None."""
+        key = self._normalize(question)
+        vector = vectorize(key)
+        norm = math.sqrt(sum(count * count for count in vector.values()))
+        words = set(map(stem, content_words(key)))
+        now = time.time()
+        with self._lock:
+            # Only questions sharing a content word can reach the threshold
+            candidates = set()
+            for word in words:
+                candidates |= self._postings.get(word, set())
+            if key in self._entries:
+                candidates.add(key)
+            best_key, best_score = None, 0.0
+            for candidate in candidates:
+                entry = self._entries[candidate]
+                if entry["expires_at"] < now or not same_terms(key, candidate):
+                    continue
+                score = cosine(vector, norm, entry["vector"], entry["norm"])
+                if score > best_score:
+                    best_key, best_score = candidate, score
+            if best_key is None or best_score < self.threshold:
+                self.misses += 1
+                count_lookup("answer", "no_tool", False)
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            count_lookup("answer", "no_tool", True)
+            return self._entries[best_key]["answer"]
+
+    def put(self, question: str, answer):
+        key = self._normalize(question)
+        vector = vectorize(key)
+        words = set(map(stem, content_words(key)))
+        entry = {
+            "answer": answer,
+            "vector": vector,
+            "norm": math.sqrt(sum(count * count for count in vector.values())),
+            "words": words,
+            "expires_at": time.time() + self.ttl,
+        }
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            for word in words:
+                self._postings.setdefault(word, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
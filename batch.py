@@ -0,0 +1,201 @@
+"""Answer a JSONL file of prompts headlessly with the chat pipeline, writing the answers as JSONL.
+
+    python batch.py prompts.jsonl answers.jsonl --workers 8
+
+Each input line needs a "prompt" (or "question") and may set "id", "lat", "lng" and "session".
+Prompts sharing a session run in order with shared conversation memory; everything else runs
+concurrently on a thread pool. The output file doubles as the checkpoint: rerunning the same
+command skips every id already answered, so an interrupted batch resumes where it stopped.
+Give every prompt an "id" for resumable runs; without one a prompt is known by its line number,
+so editing the input file between runs makes the resume skip the wrong prompts.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from memory import ConversationMemory
+from pipeline import compact_memory, run_turn
+from resources import ResourcePool, UserContext
+from telemetry import TurnTracer, cache_counts, get_metrics, percentile
+
+def read_prompts(path: str):
+    """Input records with an "id" (the line number when missing) and a "prompt"."""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            prompt = record.get("prompt") or record.get("question")
+            if not prompt:
+                continue
+            yield {**record, "id": str(record.get("id", number)), "prompt": prompt}
+
+def read_checkpoint(path: str, retry_errors: bool = False):
+    """Rows already in the output file by id; their prompts are skipped on a rerun."""
+    done = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short by an interrupted run; its prompt is answered again
+                    continue
+                if not (retry_errors and record.get("error")):
+                    done[record["id"]] = record
+    except FileNotFoundError:
+        pass
+    return done
+
+def group_sessions(records):
+    """Records grouped into units of work: one per session (in input order), one per session-less record."""
+    units = OrderedDict()
+    for record in records:
+        units.setdefault(record.get("session") or f"\0{record['id']}", []).append(record)
+    return list(units.values())
+
+class BatchRunner:
+    """Runs units of prompts on a bounded thread pool against one shared ResourcePool.
+
+    Every worker shares the pool's compiled agents and answer cache, and the process-wide disk
+    cache, spatial index, request coalescing and rate limits.
+    """
+
+    def __init__(self, pool: ResourcePool, out, workers: int = 8, lat: float = 0.0, lng: float = 0.0, done: dict = None):
+        self.pool = pool
+        self.out = out
+        self.workers = workers
+        self.lat = lat
+        self.lng = lng
+        self.done = done or {}
+        self.latencies = []
+        self.tokens = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def answer(self, record, memory) -> dict:
+        context = UserContext(lat=record.get("lat", self.lat), lng=record.get("lng", self.lng))
+        tracer = TurnTracer(get_metrics())
+        try:
+            result = run_turn(self.pool, record["prompt"], memory, context, config={"callbacks": [tracer]})
+        except Exception as e:
+            turn = tracer.finish()
+            return {"id": record["id"], "prompt": record["prompt"], "error": repr(e), "latency_ms": turn["total_ms"]}
+        turn = tracer.finish(result["route"])
+        return {
+            "id": record["id"],
+            "prompt": record["prompt"],
+            "question": result["question"],
+            "route": result["route"],
+            "cards": result["cards"],
+            "latency_ms": turn["total_ms"],
+            "tokens": sum(turn["tokens"].values()),
+            "llm_calls": turn["llm_calls"],
+            "tool_calls": turn["tool_calls"],
+        }
+
+    def _write(self, row: dict):
+        with self._lock:
+            self.out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self.out.flush()
+            self.latencies.append(row["latency_ms"])
+            self.tokens += row.get("tokens", 0)
+            self.errors += "error" in row
+
+    def run_unit(self, records):
+        memory = ConversationMemory()
+        replayed = False
+        for record in records:
+            row = self.done.get(record["id"])
+            if row is None:
+                if replayed:
+                    compact_memory(self.pool, memory)
+                    replayed = False
+                self._write(self.answer(record, memory))
+            elif "cards" in row:
+                # Answered by an earlier run: rebuild the session's memory so its follow ups keep their context
+                memory.add_user(record["prompt"])
+                memory.add_ai(row["cards"])
+                replayed = True
+
+    def run(self, units, progress_every: int = 50):
+        """Answer every unit, keeping at most twice `workers` units queued at once."""
+        started = time.perf_counter()
+        units = iter(units)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch") as executor:
+            pending = set()
+            reported = 0
+            try:
+                while True:
+                    while len(pending) < self.workers * 2:
+                        unit = next(units, None)
+                        if unit is None:
+                            break
+                        pending.add(executor.submit(self.run_unit, unit))
+                    if not pending:
+                        break
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        future.result()
+                    if progress_every and len(self.latencies) - reported >= progress_every:
+                        reported = len(self.latencies)
+                        elapsed = time.perf_counter() - started
+                        print(f"{reported} answered, {reported / elapsed:.2f}/s, {self.errors} errors", file=sys.stderr)
+            except KeyboardInterrupt:
+                # Answers already written stay in the checkpoint; the rest run on the next invocation
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed: float) -> dict:
+        count = len(self.latencies)
+        report = {
+            "answered": count,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 2),
+            "throughput_per_s": round(count / elapsed, 2) if elapsed else 0.0,
+            "tokens": self.tokens,
+            "cache": {f"{c}:{e}:{r}": n for (c, e, r), n in sorted(cache_counts(self.pool.answer_cache).items()) if n},
+        }
+        if count:
+            report.update({f"p{q}_ms": round(percentile(self.latencies, q), 1) for q in (50, 95, 99)})
+        return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file of prompts")
+    parser.add_argument("output", help="JSONL file the answers are appended to; also the resume checkpoint")
+    parser.add_argument("--workers", type=int, default=8, help="prompts (or sessions) answered concurrently")
+    parser.add_argument("--lat", type=float, default=0.0, help="location used when a prompt has none")
+    parser.add_argument("--lng", type=float, default=0.0)
+    parser.add_argument("--retry-errors", action="store_true", help="answer again the prompts that failed last time")
+    parser.add_argument("--progress-every", type=int, default=50)
+    parser.add_argument("--report", help="also write the final report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    done = read_checkpoint(args.output, args.retry_errors)
+    # Sessions keep their answered prompts so the rest of the session can replay them into its memory
+    units = [unit for unit in group_sessions(read_prompts(args.input)) if any(r["id"] not in done for r in unit)]
+    remaining = sum(record["id"] not in done for unit in units for record in unit)
+    print(f"{remaining} prompts to answer, {len(done)} already in {args.output}", file=sys.stderr)
+
+    with open(args.output, "a+", encoding="utf-8") as out:
+        end = out.tell()
+        if end:
+            out.seek(end - 1)
+            # Start on a fresh line if the last run was cut off mid-write
+            if out.read(1) != "\n":
+                out.write("\n")
+        runner = BatchRunner(ResourcePool(), out, workers=args.workers, lat=args.lat, lng=args.lng, done=done)
+        report = runner.run(units, args.progress_every)
+
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
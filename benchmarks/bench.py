@@ -0,0 +1,180 @@
+"""Replay a JSONL corpus of prompts through the chat pipeline with a fake LLM and stubbed Google APIs.
+
+    python -m benchmarks.bench --corpus benchmarks/prompts.jsonl
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tools import StructuredTool
+
+def read_corpus(path: str, limit: int = None):
+    """Prompts from a JSONL file. Each line needs a "prompt" (or "question", "body", "title") and may set a "session"."""
+    records = []
+    with open(path, encoding="utf-8") as corpus:
+        for line in corpus:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            prompt = next((record[field] for field in ("prompt", "question", "body", "title") if record.get(field)), None)
+            if prompt:
+                records.append({"prompt": prompt, "session": record.get("session", "default")})
+    return records[:limit] if limit else records
+
+def fake_tavily(latency: float):
+    """A `tavily_search` tool that answers from canned results after `latency` seconds."""
+    def tavily_search(query: str) -> dict:
+        """Search the web for recent information."""
+        time.sleep(latency)
+        return {"query": query, "results": [
+            {"title": f"Coffee news {i}", "url": f"https://example.com/news/{i}",
+             "content": f"Recent coverage related to {query}. " * 5, "score": 0.9 - i / 10}
+            for i in range(1, 6)
+        ]}
+    return StructuredTool.from_function(func=tavily_search, name="tavily_search")
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process; getrusage reports it in bytes on macOS and KB on Linux."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+class ToolCallRecorder(BaseCallbackHandler):
+    """Collects the agent's tool calls of a turn; speculative calls run without callbacks and aren't seen."""
+
+    def __init__(self):
+        self.calls = []
+
+    def on_tool_start(self, serialized, input_str, *, inputs=None, name=None, **kwargs):
+        self.calls.append(((serialized or {}).get("name") or name, inputs or {}))
+
+def speculation_hits(speculated, calls) -> int:
+    """How many speculative calls the agent made too, with the arguments that share a cache entry."""
+    def normalize(args):
+        return {key: " ".join(value.lower().split()) if isinstance(value, str) else value for key, value in args.items()}
+    made = [(tool, normalize(args)) for tool, args in calls]
+    return sum((call["tool"], normalize(call["args"])) in made for call in speculated)
+
+def summarize(turns, wall_time: float, peak_rss: float, speculation=(0, 0)):
+    from telemetry import breakdown, percentile
+    stage_times = defaultdict(list)
+    for turn in turns:
+        stage_times["turn"].append(turn["total_ms"])
+        for stage, ms in breakdown(turn).items():
+            stage_times[stage].append(ms)
+    count = len(turns) or 1
+    return {
+        "turns": len(turns),
+        "wall_time_s": round(wall_time, 3),
+        "stages": {
+            stage: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50), 1),
+                "p95_ms": round(percentile(values, 95), 1),
+                "p99_ms": round(percentile(values, 99), 1),
+            }
+            for stage, values in sorted(stage_times.items())
+        },
+        "llm_calls_per_turn": round(sum(t["llm_calls"] for t in turns) / count, 2),
+        "tool_calls_per_turn": round(sum(t["tool_calls"] for t in turns) / count, 2),
+        "tokens_per_turn": round(sum(sum(t["tokens"].values()) for t in turns) / count, 1),
+        "tool_errors": sum(t["tool_errors"] for t in turns),
+        "cache": dict(sum((Counter(t["cache"]) for t in turns), Counter())),
+        "speculated_calls": speculation[0],
+        "speculation_hit_rate": round(speculation[1] / speculation[0], 2) if speculation[0] else None,
+        "routes": {route: sum(t["route"] == route for t in turns) for route in sorted({t["route"] for t in turns})},
+        "peak_rss_mb": round(peak_rss, 1),
+    }
+
+def print_report(report, stub_requests):
+    print(f"{report['turns']} turns in {report['wall_time_s']}s")
+    print(f"{'stage':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:<28}{row['count']:>7}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+    print(f"LLM calls/turn: {report['llm_calls_per_turn']}  tool calls/turn: {report['tool_calls_per_turn']}  "
+          f"tokens/turn: {report['tokens_per_turn']}")
+    print(f"routes: {report['routes']}  tool errors: {report['tool_errors']}")
+    print(f"speculated calls: {report['speculated_calls']}  used by the agent: {report['speculation_hit_rate']}")
+    print(f"cache: {report['cache']}")
+    print(f"stub requests: {stub_requests}")
+    print(f"peak RSS: {report['peak_rss_mb']} MB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(__file__), "prompts.jsonl"))
+    parser.add_argument("--limit", type=int, help="replay only the first N prompts")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the corpus this many times")
+    parser.add_argument("--json", dest="json_path", help="also write the report as JSON to this path")
+    parser.add_argument("--lat", type=float, default=-6.2088)
+    parser.add_argument("--lng", type=float, default=106.8456)
+    parser.add_argument("--llm-first-token", type=float, default=0.3, help="fake LLM time to first token (s)")
+    parser.add_argument("--llm-per-token", type=float, default=0.005, help="fake LLM time per output token (s)")
+    parser.add_argument("--places-latency", type=float, default=0.25)
+    parser.add_argument("--geocode-latency", type=float, default=0.12)
+    parser.add_argument("--detail-latency", type=float, default=0.15)
+    parser.add_argument("--photo-latency", type=float, default=0.1)
+    parser.add_argument("--tavily-latency", type=float, default=0.4)
+    args = parser.parse_args(argv)
+
+    # Everything the pipeline reads from the environment must be set before it is imported
+    os.environ.setdefault("GPLACES_API_KEY", "bench")
+    os.environ.setdefault("TAVILY_API_KEY", "bench")
+    os.environ.setdefault("GOOGLE_API_KEY", "bench")
+    os.environ["CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="coffeegpt-bench-"), "cache.sqlite3")
+    os.environ.pop("ROUTER_LOG_PATH", None)
+
+    from benchmarks.fake_llm import FakeChatModel
+    from benchmarks.stub_servers import StubGoogleServer
+    import transport
+    from memory import ConversationMemory
+    from pipeline import run_turn
+    from resources import ResourcePool, UserContext
+    from telemetry import TurnTracer
+    from tools import find_places_by_text, geocode_place, get_place_detail
+
+    records = read_corpus(args.corpus, args.limit) * args.repeat
+    if not records:
+        sys.exit(f"No prompts found in {args.corpus}")
+
+    server = StubGoogleServer({
+        "search_text": args.places_latency,
+        "geocode": args.geocode_latency,
+        "place_detail": args.detail_latency,
+        "photo": args.photo_latency,
+    })
+    with server:
+        transport.PLACES_BASE_URL = server.places_base_url
+        transport.GEOCODE_URL = server.geocode_url
+        pool = ResourcePool(
+            llm=FakeChatModel(first_token_latency=args.llm_first_token, token_latency=args.llm_per_token),
+            tools=[find_places_by_text, geocode_place, fake_tavily(args.tavily_latency), get_place_detail],
+        )
+        context = UserContext(lat=args.lat, lng=args.lng)
+        memories = defaultdict(ConversationMemory)
+
+        turns = []
+        speculated = used = 0
+        started = time.perf_counter()
+        for index, record in enumerate(records, 1):
+            tracer = TurnTracer()
+            recorder = ToolCallRecorder()
+            result = run_turn(pool, record["prompt"], memories[record["session"]], context, config={"callbacks": [tracer, recorder]})
+            turns.append(tracer.finish(result["route"]))
+            speculated += len(result["speculated"])
+            used += speculation_hits(result["speculated"], recorder.calls)
+            print(f"[{index}/{len(records)}] {result['route']:<20} {turns[-1]['total_ms']:8.1f} ms  {record['prompt'][:60]}",
+                  file=sys.stderr)
+        wall_time = time.perf_counter() - started
+
+    report = summarize(turns, wall_time, peak_rss_mb(), (speculated, used))
+    print_report(report, server.requests)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as out:
+            json.dump({**report, "stub_requests": server.requests}, out, indent=2)
+
+if __name__ == "__main__":
+    main()
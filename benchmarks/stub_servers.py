@@ -0,0 +1,193 @@
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Size of the fake image served when a client follows the photo redirect
+IMAGE_BYTES = 200_000
+
+DEFAULT_LATENCIES = {
+    "search_text": 0.25,
+    "geocode": 0.12,
+    "place_detail": 0.15,
+    "photo": 0.1,
+    "image": 0.2,
+}
+
+def _seed(text: str) -> int:
+    return zlib.crc32(text.lower().encode("utf-8"))
+
+def fake_places(query: str, lat: float, lng: float, count: int = 5):
+    """Deterministic Places text-search results scattered around (lat, lng)."""
+    seed = _seed(query)
+    places = []
+    for i in range(count):
+        place_id = f"stub{seed % 100000}x{i}"
+        offset = ((seed >> i) % 200 - 100) / 10000
+        places.append({
+            "id": place_id,
+            "location": {"latitude": lat + offset, "longitude": lng - offset},
+            "displayName": {"text": f"Stub Coffee {seed % 97} #{i + 1}", "languageCode": "en"},
+            "formattedAddress": f"{i + 10} Bean Street, Stubville",
+            "rating": round(3.5 + (seed >> i) % 15 / 10, 1),
+            "googleMapsLinks": {
+                "placeUri": f"https://maps.google.com/?cid={place_id}",
+                "directionsUri": f"https://www.google.com/maps/dir//{place_id}",
+                "writeAReviewUri": f"https://www.google.com/maps/place//data={place_id}",
+                "reviewsUri": f"https://www.google.com/maps/place//data={place_id}/reviews",
+                "photosUri": f"https://www.google.com/maps/place//data={place_id}/photos",
+            },
+            "photos": [
+                {
+                    "name": f"places/{place_id}/photos/p{j}",
+                    "widthPx": 4032,
+                    "heightPx": 3024,
+                    "authorAttributions": [{
+                        "displayName": "Stub Photographer",
+                        "uri": "https://maps.google.com/maps/contrib/1",
+                        "photoUri": "https://lh3.googleusercontent.com/a/stub",
+                    }],
+                    "flagContentUri": "https://www.google.com/local/imagery/report/?cb_client=maps_api_places",
+                    "googleMapsUri": "https://www.google.com/maps/place//data=!3m4!1e2",
+                }
+                for j in range(4)
+            ],
+        })
+    return places
+
+def fake_place_detail(place_id: str):
+    periods = [
+        {"open": {"day": day, "hour": 7, "minute": 0}, "close": {"day": day, "hour": 22, "minute": 0}}
+        for day in range(7)
+    ]
+    return {
+        "name": f"places/{place_id}",
+        "formattedAddress": "10 Bean Street, Stubville",
+        "nationalPhoneNumber": "021 555 0100",
+        "rating": 4.6,
+        "dineIn": True,
+        "delivery": False,
+        "outdoorSeating": True,
+        "priceRange": {
+            "startPrice": {"currencyCode": "IDR", "units": "50000"},
+            "endPrice": {"currencyCode": "IDR", "units": "100000"},
+        },
+        "currentOpeningHours": {
+            "openNow": True,
+            "periods": periods,
+            "weekdayDescriptions": [f"{day}: 7:00 AM – 10:00 PM" for day in
+                                    ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]],
+            "nextCloseTime": "2025-01-01T15:00:00Z",
+        },
+        "reviewSummary": {
+            "text": {"text": "People like the single-origin pour overs and the quiet upstairs seating. " * 3},
+            "flagContentUri": "https://www.google.com/local/review/rap/report?postId=stub",
+            "disclosureText": {"text": "Summarized with Gemini", "languageCode": "en-US"},
+        },
+    }
+
+class StubGoogleServer:
+    """Local stand-in for the Places, Geocoding and photo endpoints with configurable latencies.
+
+    Point the tools at it through `transport.PLACES_BASE_URL` and `transport.GEOCODE_URL`.
+    """
+
+    def __init__(self, latencies: dict = None, host: str = "127.0.0.1", port: int = 0):
+        self.latencies = {**DEFAULT_LATENCIES, **(latencies or {})}
+        self.requests = {endpoint: 0 for endpoint in self.latencies}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-google", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def places_base_url(self) -> str:
+        return f"{self.base_url}/v1"
+
+    @property
+    def geocode_url(self) -> str:
+        return f"{self.base_url}/maps/api/geocode/json"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _hit(self, endpoint: str):
+        with self._lock:
+            self.requests[endpoint] += 1
+        time.sleep(self.latencies[endpoint])
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json", headers: dict = None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, payload, status: int = 200):
+                self._send(status, json.dumps(payload).encode("utf-8"))
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)) or 0)
+                if url.path == "/v1/places:searchText":
+                    stub._hit("search_text")
+                    payload = json.loads(body or b"{}")
+                    center = payload.get("locationBias", {}).get("circle", {}).get("center", {})
+                    places = fake_places(payload.get("textQuery", ""), center.get("latitude", -6.2), center.get("longitude", 106.8))
+                    return self._json({"places": places[: payload.get("pageSize", 5)]})
+                self._json({"error": {"code": 404, "message": "Not found"}}, 404)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == "/maps/api/geocode/json":
+                    stub._hit("geocode")
+                    address = query.get("address", [""])[0]
+                    seed = _seed(address)
+                    return self._json({"status": "OK", "results": [{
+                        "geometry": {"location": {"lat": -6.2 + seed % 1000 / 10000, "lng": 106.8 + seed % 777 / 10000}},
+                        "place_id": f"stubgeo{seed % 100000}",
+                    }]})
+                if url.path.startswith("/v1/places/") and url.path.endswith("/media"):
+                    stub._hit("photo")
+                    if query.get("skipHttpRedirect", ["false"])[0] == "true":
+                        return self._json({"name": url.path[4:-6], "photoUri": f"{stub.base_url}/img{url.path[3:-6]}.jpg"})
+                    return self._send(302, b"", headers={"Location": f"{stub.base_url}/img{url.path[3:-6]}.jpg"})
+                if url.path.startswith("/img/"):
+                    stub._hit("image")
+                    return self._send(200, b"\xff" * IMAGE_BYTES, content_type="image/jpeg")
+                if url.path.startswith("/v1/places/"):
+                    stub._hit("place_detail")
+                    return self._json(fake_place_detail(url.path.rsplit("/", 1)[-1]))
+                self._json({"error": {"code": 404, "message": "Not found"}}, 404)
+
+        return Handler
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+DEFAULT_CACHE_PATH = os.environ.get("CACHE_PATH", ".cache/coffeegpt.sqlite3")
+DEFAULT_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "20000"))
+
+# Seconds each kind of response stays fresh. Geocodes barely change, cafe details change slowly.
+ENDPOINT_TTLS = {
+    "geocode": 30 * 24 * 3600,
+    "place_detail": 24 * 3600,
+    "search_text": 6 * 3600,
+    "photo": 24 * 3600,
+}
+
+# Coordinates are bucketed to 3 decimals (~110 m) so nearby users share entries
+LATLNG_PRECISION = 3
+
+# Eviction runs every this many writes rather than on each one
+_EVICT_EVERY = 100
+
+# Cache lookups of the turn running in this context (see telemetry.TurnTracer); None outside a traced turn
+turn_lookups = ContextVar("turn_lookups", default=None)
+_turn_lookups_lock = threading.Lock()
+
+def count_lookup(cache: str, endpoint: str, hit: bool):
+    """Count a cache hit or miss towards the current turn, if one is being traced."""
+    counts = turn_lookups.get()
+    if counts is not None:
+        with _turn_lookups_lock:
+            counts[(cache, endpoint, "hit" if hit else "miss")] += 1
+
+def make_key(endpoint: str, query: str = None, lat: float = None, lng: float = None, radius: int = None, **extra):
+    """Normalized cache key: collapsed lowercase query, rounded lat/lng bucket and radius."""
+    parts = {
+        "endpoint": endpoint,
+        "query": " ".join(query.lower().split()) if query else None,
+        "lat": round(lat, LATLNG_PRECISION) if lat is not None else None,
+        "lng": round(lng, LATLNG_PRECISION) if lng is not None else None,
+        "radius": radius,
+        **extra,
+    }
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+class DiskCache:
+    """SQLite-backed TTL cache shared by every session and worker process on this host.
+
+    Entries expire after their endpoint TTL and the least recently used ones are evicted
+    once the cache holds more than `max_entries`. SQLite errors (e.g. "database is locked" while
+    another worker writes) never fail a request: a failed read is a miss and a failed write is skipped.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES, ttls: dict = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = {**ENDPOINT_TTLS, **(ttls or {})}
+        self.hits = Counter()
+        self.misses = Counter()
+        self.errors = Counter()
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, endpoint TEXT, value TEXT, expires_at REAL, accessed_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+
+    def _connect(self):
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, endpoint: str, key: str):
+        """Return the cached value, or None when missing or expired."""
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            self.errors[endpoint] += 1
+            row = None
+        if row is None or row[1] < now:
+            self.misses[endpoint] += 1
+            count_lookup("disk", endpoint, False)
+            return None
+        try:
+            with conn:
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            # Only the LRU order is stale; the value itself is still good
+            self.errors[endpoint] += 1
+        self.hits[endpoint] += 1
+        count_lookup("disk", endpoint, True)
+        return json.loads(row[0])
+
+    def set(self, endpoint: str, key: str, value, ttl: float = None):
+        now = time.time()
+        ttl = self.ttls.get(endpoint, 3600) if ttl is None else ttl
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, endpoint, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, endpoint, json.dumps(value, ensure_ascii=False), now + ttl, now),
+                )
+        except sqlite3.Error:
+            self.errors[endpoint] += 1
+            return
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % _EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones beyond `max_entries`."""
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+                conn.execute(
+                    "DELETE FROM entries WHERE key IN ("
+                    "SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+        except sqlite3.Error:
+            # Retried on a later write
+            self.errors["evict"] += 1
+
+    def stats(self):
+        """Hit, miss and SQLite error counts per endpoint for this process."""
+        endpoints = set(self.hits) | set(self.misses) | set(self.errors)
+        return {
+            endpoint: {"hits": self.hits[endpoint], "misses": self.misses[endpoint], "errors": self.errors[endpoint]}
+            for endpoint in endpoints
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> DiskCache:
+    """Return the process-wide disk cache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DiskCache()
+    return _cache
@@ -1,29 +1,105 @@
-import time
 from typing import List
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
 from langchain_core.tools import Tool
 import os
-import requests
-import streamlit as st
+import threading
+import httpx
+import transport
+from cache import get_cache, make_key
+from ratelimit import RateLimitExceeded, get_bucket
 
-def stream_data(input_string: str):
-    """A generator that yields one character at a time from the input string."""
-    for char in input_string.split(" "):
-        yield char + " "
-        time.sleep(0.02)
+# Photo lookups for a result set run side by side on this shared pool
+_photo_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="photo")
+_inflight_photos = {}
+_inflight_lock = threading.RLock()
+
+def _photo_request(photo_resource: str):
+    # skipHttpRedirect returns the photo URI as JSON instead of redirecting to the image bytes
+    params = {
+        "maxHeightPx": 400,
+        "maxWidthPx": 400,
+        "skipHttpRedirect": "true",
+        "key": os.environ["GPLACES_API_KEY"],
+    }
+    return {
+        "method": "GET",
+        "url": f"{transport.PLACES_BASE_URL}/{photo_resource}/media",
+        "params": params,
+        "bucket": get_bucket(os.environ["GPLACES_API_KEY"]),
+    }
+
+def _parse_photo(response: httpx.Response):
+    if response.status_code != 200:
+        return "NOT_FOUND"
+
+    return response.json().get("photoUri", "NOT_FOUND")
 
 def get_photo_from_place(photo_resource: str):
     """Get the photo URI from a photo name returned by the Google Places API."""
-    url = (
-        f"https://places.googleapis.com/v1/{photo_resource}/media"
-        f"?maxHeightPx=400&maxWidthPx=400&key={os.environ['GPLACES_API_KEY']}"
-    )
-    response = requests.get(url)
+    try:
+        response = transport.request(**_photo_request(photo_resource))
+    except (httpx.HTTPError, RateLimitExceeded):
+        return "NOT_FOUND"
+    return _parse_photo(response)
 
-    if response.status_code != 200:
+async def aget_photo_from_place(photo_resource: str):
+    """Async variant of `get_photo_from_place`."""
+    try:
+        response = await transport.arequest(**_photo_request(photo_resource))
+    except (httpx.HTTPError, RateLimitExceeded):
         return "NOT_FOUND"
+    return _parse_photo(response)
 
-    return response.url
+def build_shop_cards(places: List[dict]):
+    """Turn the raw places returned by `find_places_by_text` into renderable shop cards."""
+    shops = []
+    for i, place in enumerate(places):
+        name = place.get("displayName", {}).get("text", "Unknown")
+        map_link = place.get("googleMapsLinks", {}).get("placeUri", "")
+        info = (
+            f"**{i+1}. {name}**\n"
+            f"   - Address: {place.get('formattedAddress', 'N/A')}\n"
+            f"   - Rating: {place.get('rating', 'N/A')}\n"
+            f"   - Google Maps: [Navigate to Place]({map_link})"
+        )
+        photos = place.get("photos") or []
+        # The photo is resolved separately (see `resolve_photos`) so the card can render first
+        shops.append({
+            "info": info,
+            "photo_url": None,
+            "photo_ref": photos[0]["name"] if photos else None,
+            "name": name,
+            "place_id": place.get("id"),
+        })
+    return shops
 
-@st.cache_data(show_spinner=False)
 def cached_photo(photo_ref):
-    return get_photo_from_place(photo_ref)
\ No newline at end of file
+    """Photo URI for a photo name, served from the shared disk cache when possible."""
+    key = make_key("photo", photo=photo_ref)
+    photo_url = get_cache().get("photo", key)
+    if photo_url is None:
+        photo_url = get_photo_from_place(photo_ref)
+        if photo_url != "NOT_FOUND":
+            get_cache().set("photo", key, photo_url)
+    return photo_url
+
+def resolve_photo(photo_ref) -> Future:
+    """Start resolving a photo URI in the background; identical in-flight lookups share one future."""
+    with _inflight_lock:
+        future = _inflight_photos.get(photo_ref)
+        if future is None:
+            # In the caller's context, so its cache lookups count towards the turn that started it
+            future = _photo_executor.submit(copy_context().run, cached_photo, photo_ref)
+            _inflight_photos[photo_ref] = future
+            # Runs inline if the lookup already finished, hence the re-entrant lock
+            future.add_done_callback(lambda _: _forget_photo(photo_ref))
+    return future
+
+def _forget_photo(photo_ref):
+    with _inflight_lock:
+        _inflight_photos.pop(photo_ref, None)
+
+def resolve_photos(shops: List[dict]):
+    """Start resolving the photos of every shop card at once. Returns a list of (future, card)."""
+    return [(resolve_photo(shop["photo_ref"]), shop) for shop in shops if shop.get("photo_ref")]
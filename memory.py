@@ -0,0 +1,96 @@
+import re
+from collections import deque
+
+# Rough token estimate; close enough for budgeting and needs no tokenizer call
+CHARS_PER_TOKEN = 4
+
+DEFAULT_TOKEN_BUDGET = 1500
+
+# Recent lines that are never folded into the summary
+KEEP_RECENT_LINES = 4
+
+MAX_ANSWER_CHARS = 400
+MAX_SUMMARY_CHARS = 1200
+
+_SOURCE = re.compile(r"\[:orange-badge\[(.*?)\]\]\((.*?)\)")
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 1].rstrip() + "…"
+
+def collapse_answer(content) -> str:
+    """Short transcript form of an AI answer: shops become name plus placeId, search results their source."""
+    if isinstance(content, str):
+        return shorten(content, MAX_ANSWER_CHARS)
+
+    parts = []
+    for card in content:
+        if card.get("name"):
+            parts.append(f"{card['name']} (placeId: {card.get('place_id', 'unknown')})")
+            continue
+        source = _SOURCE.search(card["info"])
+        if source:
+            text = _SOURCE.sub("", card["info"])
+            parts.append(f"{shorten(text, 120)} (source: {source.group(1)})")
+        else:
+            parts.append(shorten(card["info"], 200))
+    return "; ".join(parts)
+
+class ConversationMemory:
+    """Rolling transcript for the rephrase prompt, kept under a token budget.
+
+    Lines are rendered once when a turn is added. When the transcript grows past the budget,
+    the oldest lines are folded into a running summary.
+    """
+
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET, keep_recent: int = KEEP_RECENT_LINES):
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.summary = ""
+        self.lines = deque()
+        self.tokens = 0
+
+    def __bool__(self):
+        return bool(self.lines or self.summary)
+
+    def _append(self, line: str):
+        self.lines.append(line)
+        self.tokens += estimate_tokens(line)
+
+    def add_user(self, text: str):
+        self._append(f"Human: {shorten(text, MAX_ANSWER_CHARS)}")
+
+    def add_ai(self, content):
+        self._append(f"AI: {collapse_answer(content)}")
+
+    def render(self) -> str:
+        """The transcript to pass as `chat_history`."""
+        lines = list(self.lines)
+        if self.summary:
+            lines.insert(0, f"Summary of the earlier conversation: {self.summary}")
+        return "\n".join(lines)
+
+    def needs_compaction(self) -> bool:
+        return self.tokens + estimate_tokens(self.summary) > self.token_budget and len(self.lines) > self.keep_recent
+
+    def compact(self, summarize=None):
+        """Fold the oldest lines into the summary until the transcript fits the budget.
+
+        `summarize(summary, lines)` returns the new summary, e.g. from an LLM; without it the
+        summary keeps the most recent text that fits.
+        """
+        evicted = []
+        while self.needs_compaction():
+            line = self.lines.popleft()
+            self.tokens -= estimate_tokens(line)
+            evicted.append(line)
+        if not evicted:
+            return
+        if summarize is not None:
+            self.summary = shorten(summarize(self.summary, "\n".join(evicted)), MAX_SUMMARY_CHARS)
+        else:
+            text = " ".join([self.summary, *evicted]).strip()
+            self.summary = text[-MAX_SUMMARY_CHARS:]
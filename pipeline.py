@@ -0,0 +1,282 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextvars import copy_context
+from difflib import SequenceMatcher
+from langchain_core.messages import AIMessageChunk, ToolMessage
+from langchain_core.utils.json import parse_partial_json
+from answer_cache import is_cacheable
+from helper import build_shop_cards, resolve_photos
+from memory import estimate_tokens
+from router import named_place
+from schema import SearchResult
+from telemetry import find_tracer
+
+NOT_RELATED_ANSWER = "Sorry, I'm not an expert at that field."
+
+# Progress messages shown while the agent waits on a tool
+TOOL_STATUS = {
+    "find_places_by_text": "Searching for coffee shops...",
+    "geocode_place": "Looking up the location...",
+    "get_place_detail": "Fetching the cafe details...",
+    "tavily_search": "Searching the web for the latest coffee news...",
+}
+
+# Routing and speculative tool calls overlap the rest of the turn on this shared pool
+_speculation_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="speculate")
+
+# Up to this much history a follow up rarely changes route when rephrased, so routing starts on the raw prompt
+SPECULATIVE_HISTORY_TOKENS = 400
+
+# Follow ups that lean on the conversation; their rephrase always differs, so routing them early is wasted
+_REFERS_BACK = re.compile(
+    r"\b(it|its|they|them|their|that|those|these|this|one|ones|first|second|third|last|there|same|other|else|more)\b"
+)
+
+def _rephrase(pool, prompt: str, chat_history_text: str, config=None) -> str:
+    return pool.rephraser_chain.invoke({
+        "chat_history": chat_history_text,
+        "input": prompt
+    }, config={**(config or {}), "run_name": "rephrase"}).content
+
+def _llm_route(pool, question: str, config=None) -> str:
+    return pool.routing_chain.invoke(
+        {"question": question}, config={**(config or {}), "run_name": "route"}
+    ).final_tool_to_use
+
+def _route(pool, question: str, config=None) -> str:
+    route = pool.router.route(question)
+    if route is None:
+        route = _llm_route(pool, question, config)
+        pool.router.log_decision(question, route)
+    return route
+
+def _same_question(a: str, b: str) -> bool:
+    words = lambda text: " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+    return SequenceMatcher(None, words(a), words(b)).ratio() >= 0.9
+
+def route_question(pool, prompt: str, chat_history_text: str, config=None):
+    """Rephrase the prompt into a standalone question and decide which tool should answer it.
+
+    The rephrase is skipped when there is no earlier conversation, and the LLM router is only
+    called when the local router is unsure. With a short history, a prompt that doesn't refer
+    back to the conversation is routed by the LLM while the rephrase runs; that route is kept
+    only if the rephrase comes back (nearly) unchanged. `config` is passed on to the chains.
+    """
+    if not chat_history_text:
+        return prompt, _route(pool, prompt, config)
+    speculate = (
+        estimate_tokens(chat_history_text) <= SPECULATIVE_HISTORY_TOKENS
+        and not _REFERS_BACK.search(prompt.lower())
+        and pool.router.route(prompt) is None
+    )
+    if not speculate:
+        rephrased_question = _rephrase(pool, prompt, chat_history_text, config)
+        return rephrased_question, _route(pool, rephrased_question, config)
+
+    speculative_route = _speculation_executor.submit(copy_context().run, _llm_route, pool, prompt, config)
+    rephrased_question = _rephrase(pool, prompt, chat_history_text, config)
+    if _same_question(prompt, rephrased_question) and pool.router.route(rephrased_question) is None:
+        route = speculative_route.result()
+        pool.router.log_decision(rephrased_question, route)
+        return rephrased_question, route
+    # The rephrase changed the question: its route no longer applies and is dropped if still running
+    speculative_route.cancel()
+    return rephrased_question, _route(pool, rephrased_question, config)
+
+def speculate_tools(pool, prompt: str):
+    """Start the `geocode_place` call the agent is about to make for a named place, before routing has finished.
+
+    When the agent then geocodes the same place it joins the in-flight request or hits the cache;
+    a call it never makes is simply discarded. Returns the started calls as {"tool", "args", "future"}.
+    Only geocodes are speculated: a place name comes out of the prompt the same way the agent
+    reads it, while a free-text cafe search query is the agent's own wording.
+    """
+    label, confidence = pool.router.classify(prompt)
+    if label not in ("find_places_by_text", "get_place_detail") or confidence < pool.router.threshold:
+        return []
+    tools = {tool.name: tool for tool in pool.tools}
+    place_name = named_place(prompt)
+    if not place_name or "geocode_place" not in tools:
+        return []
+    args = {"place_name": place_name}
+    future = _speculation_executor.submit(copy_context().run, tools["geocode_place"].invoke, args)
+    return [{"tool": "geocode_place", "args": args, "future": future}]
+
+def compact_memory(pool, memory, config=None):
+    """Fold old turns of `memory` into its running summary using the LLM, if it is over budget.
+
+    A failed summary call keeps the evicted lines verbatim in the summary instead of failing the turn.
+    """
+    def summarize(summary, lines):
+        try:
+            return pool.summary_chain.invoke(
+                {"summary": summary, "lines": lines}, config={**(config or {}), "run_name": "summary"}
+            ).content
+        except Exception:
+            return f"{summary}\n{lines}".strip()
+
+    if memory.needs_compaction():
+        memory.compact(summarize)
+
+def search_result_card(item):
+    """Render one SearchResult item (model or partially parsed dict) as a markdown card."""
+    text = item["text"] if isinstance(item, dict) else item.text
+    source = item.get("source", "") if isinstance(item, dict) else item.source
+    return {"info": f"{text.strip()}  {source.strip()}", "photo_url": None}
+
+def finished_photos(pending_photos, block: bool = False):
+    """Yield "photo" events for resolved shop photos, removing them from `pending_photos`."""
+    if block:
+        wait([future for future, _ in pending_photos])
+    for future, card in [(future, card) for future, card in pending_photos if future.done()]:
+        pending_photos.remove((future, card))
+        card["photo_url"] = future.result()
+        yield {"type": "photo", "card": card}
+
+def stream_answer(pool, question: str, route: str, context, config=None):
+    """Run the agent for a routed question, yielding events as they are produced.
+
+    Events are dicts with a "type" key:
+    - "status": {"text"} progress message while a tool is running
+    - "token": {"text"} a piece of the agent's prose answer
+    - "card": {"card"} a finished shop card or search result, ready to render
+    - "retract": {"cards"} search results already sent from a structured answer that failed validation
+    - "photo": {"card"} a shop card whose photo_url has just been resolved
+    - "done": {"cards", "history"} every card of the turn, and what to keep in the chat history
+    """
+    if route == "not_related":
+        card = {"info": NOT_RELATED_ANSWER, "photo_url": None}
+        yield {"type": "card", "card": card}
+        yield {"type": "done", "cards": [card], "history": NOT_RELATED_ANSWER}
+        return
+
+    cacheable = is_cacheable(question, route)
+    if cacheable:
+        answer = pool.answer_cache.get(question)
+        if answer is not None:
+            for card in answer["cards"]:
+                yield {"type": "card", "card": card}
+            yield {"type": "done", **answer}
+            return
+
+    response_format = SearchResult if route == "TavilySearch" else None
+    agent = pool.get_agent(response_format)
+
+    cards = []
+    text = ""
+    structured_args = {}
+    emitted_results = 0
+    structured_response = None
+    pending_photos = []
+    photos_started = None
+    photos_resolved = []
+    config = {**(config or {}), "run_name": "agent"}
+    for mode, chunk in agent.stream({"messages": question}, config=config, context=context, stream_mode=["messages", "updates"]):
+        yield from finished_photos(pending_photos)
+        if mode == "messages":
+            message, metadata = chunk
+            if not isinstance(message, AIMessageChunk) or metadata.get("langgraph_node") != "model":
+                continue
+            text += message.text
+            if message.text and response_format is None:
+                yield {"type": "token", "text": message.text}
+            if response_format is not None:
+                # The structured answer arrives as a tool call; emit each result once the next one starts
+                for tool_chunk in message.tool_call_chunks:
+                    entry = structured_args.setdefault(tool_chunk.get("index"), {"name": None, "args": ""})
+                    entry["name"] = tool_chunk.get("name") or entry["name"]
+                    entry["args"] += tool_chunk.get("args") or ""
+                for entry in structured_args.values():
+                    if entry["name"] != response_format.__name__:
+                        continue
+                    partial = parse_partial_json(entry["args"]) or {}
+                    results = partial.get("results") or []
+                    while emitted_results < len(results) - 1:
+                        card = search_result_card(results[emitted_results])
+                        cards.append(card)
+                        emitted_results += 1
+                        yield {"type": "card", "card": card}
+            continue
+
+        for node, update in chunk.items():
+            if not update:
+                continue
+            if node == "model":
+                for message in update.get("messages", []):
+                    for tool_call in getattr(message, "tool_calls", []):
+                        if tool_call["name"] in TOOL_STATUS:
+                            yield {"type": "status", "text": TOOL_STATUS[tool_call["name"]]}
+                    # A new model step starts a fresh set of tool calls
+                    structured_args = {}
+                structured_response = update.get("structured_response", structured_response)
+                if response_format is not None and structured_response is None and emitted_results:
+                    # The structured answer failed validation and the model is asked to try again:
+                    # take back the results streamed from it, the retry starts its own
+                    yield {"type": "retract", "cards": cards}
+                    cards = []
+                    emitted_results = 0
+            elif node == "tools" and response_format is None and not cards:
+                for message in update.get("messages", []):
+                    if isinstance(message, ToolMessage) and message.name == "find_places_by_text" and message.status != "error" and message.artifact and not cards:
+                        # Render the shop cards straight from the tool output as soon as it lands, whatever
+                        # the route, since the agent never lists shops itself; photos resolve in the background
+                        shop_cards = build_shop_cards(message.artifact)
+                        photos_started = time.perf_counter()
+                        pending_photos = resolve_photos(shop_cards)
+                        for future, _ in pending_photos:
+                            future.add_done_callback(lambda _: photos_resolved.append(time.perf_counter()))
+                        for card in shop_cards:
+                            cards.append(card)
+                            yield {"type": "card", "card": card}
+
+    yield from finished_photos(pending_photos, block=True)
+    tracer = find_tracer(config)
+    if tracer is not None and photos_started is not None:
+        tracer.add_span("photos", photos_started, max(photos_resolved, default=time.perf_counter()))
+
+    if structured_response is not None:
+        for item in structured_response.results[emitted_results:]:
+            card = search_result_card(item)
+            cards.append(card)
+            yield {"type": "card", "card": card}
+        yield {"type": "done", "cards": cards, "history": cards}
+    elif cards:
+        if text.strip():
+            cards.append({"info": text.strip(), "photo_url": None})
+        yield {"type": "done", "cards": cards, "history": cards}
+    else:
+        cards = [{"info": text, "photo_url": None}]
+        if cacheable and text.strip():
+            pool.answer_cache.put(question, {"cards": cards, "history": text})
+        yield {"type": "done", "cards": cards, "history": text}
+
+def run_turn(pool, prompt: str, memory, context, config=None):
+    """Answer one prompt headlessly (no Streamlit): route, run the agent and wait for every photo.
+
+    `memory` is updated with the turn. Returns the "done" event plus the "question", the "route"
+    and the tool calls "speculated" for it.
+    """
+    speculated = speculate_tools(pool, prompt)
+    question, route = route_question(pool, prompt, memory.render(), config)
+    done = None
+    for event in stream_answer(pool, question, route, context, config):
+        if event["type"] == "done":
+            done = event
+    memory.add_user(prompt)
+    memory.add_ai(done["history"])
+    compact_memory(pool, memory, config)
+    return {**done, "question": question, "route": route,
+            "speculated": [{"tool": call["tool"], "args": call["args"]} for call in speculated]}
+
+def prewarm_answers(pool, questions):
+    """Answer `questions` once so their cacheable answers are ready before anyone asks."""
+    for question in questions:
+        try:
+            route = pool.router.route(question) or pool.routing_chain.invoke({"question": question}).final_tool_to_use
+            if is_cacheable(question, route):
+                for _ in stream_answer(pool, question, route, None):
+                    pass
+        except Exception:
+            # Pre-warming is best effort; the question is simply answered live instead
+            continue
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+# Requests per second and burst size allowed per Google API key, shared by every session in this process
+GOOGLE_RATE_LIMIT = float(os.environ.get("GOOGLE_RATE_LIMIT", 10))
+GOOGLE_BURST = int(os.environ.get("GOOGLE_BURST", 20))
+
+# A call waits at most this long for a token before failing instead of queueing behind a spike
+MAX_TOKEN_WAIT = float(os.environ.get("GOOGLE_MAX_TOKEN_WAIT", 2.0))
+
+class RateLimitExceeded(Exception):
+    """No request budget became available within the allowed wait."""
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float = GOOGLE_RATE_LIMIT, capacity: int = GOOGLE_BURST, max_wait: float = MAX_TOKEN_WAIT):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token, possibly one not yet refilled, and return how long to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if wait > self.max_wait:
+                raise RateLimitExceeded(f"request budget exhausted, next slot in {wait:.1f}s")
+            self._tokens -= 1
+            return wait
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_bucket(api_key: str) -> TokenBucket:
+    """The request budget shared by every call made with `api_key` in this process."""
+    bucket = _buckets.get(api_key)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.setdefault(api_key, TokenBucket())
+    return bucket
+
+class SingleFlight:
+    """Merges identical in-flight calls: the first caller for a key does the work, the rest share its outcome.
+
+    Sync and async callers share the same flights, so a session thread and an event loop asking
+    for the same key still make only one upstream request.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _land(self, key, future: Future, result=None, error: BaseException = None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        """Return `fn()`, or the result of the identical call already in flight."""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._land(key, future, error=e)
+            raise
+        self._land(key, future, result)
+        return result
+
+    async def ado(self, key, fn):
+        """Async variant of `do`; `fn` returns an awaitable."""
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._land(key, future, error=e)
+            raise
+        self._land(key, future, result)
+        return result
+
+    def __len__(self):
+        return len(self._calls)
@@ -0,0 +1,97 @@
+import streamlit as st
+from telemetry import breakdown
+
+# Finished turns shown per page; older ones stay behind a "Show earlier messages" button
+HISTORY_PAGE_SIZE = 10
+
+def render_shops(message, shops):
+    """Render a finished turn: each shop card or answer block, with its photo if any."""
+    for shop in shops:
+        render_shop(message, shop)
+
+def render_shop(message, shop):
+    # For TavilySearch, always use st.markdown for info
+    if shop["photo_url"] is None:
+        message.markdown(shop["info"])
+    else:
+        message.write(shop["info"])
+        if shop["photo_url"] and shop["photo_url"] != "NOT_FOUND":
+            message.image(shop["photo_url"], caption="The photo of the coffee shop.")
+
+def render_timings(message, turn):
+    """Caption with where the time of a turn went, e.g. "route 310 ms · agent 1.4 s · total 2.1 s"."""
+    def fmt(ms):
+        return f"{ms / 1000:.1f} s" if ms >= 1000 else f"{ms:.0f} ms"
+    # LLM calls are already counted inside the rephrase, route and agent stages
+    parts = [f"{name} {fmt(ms)}" for name, ms in breakdown(turn).items() if name != "llm"]
+    parts.append(f"total {fmt(turn['total_ms'])}")
+    message.caption(" · ".join(parts) + f" · {sum(turn['tokens'].values())} tokens", help="Latency breakdown of this answer")
+
+def render_stream(message, events):
+    """Render the events of the active turn into `message` as they arrive and return its "done" event."""
+    status = message.empty()
+    card_slots = {}
+    photo_slots = {}
+    events = iter(events)
+    pending = next(events, None)
+
+    def tokens():
+        nonlocal pending
+        while pending is not None and pending["type"] == "token":
+            yield pending["text"]
+            pending = next(events, None)
+
+    while pending is not None:
+        if pending["type"] == "token":
+            status.empty()
+            message.write_stream(tokens())
+            continue
+        if pending["type"] == "status":
+            status.caption(pending["text"])
+        elif pending["type"] == "card":
+            status.empty()
+            # Each card in its own slot, so a retracted one can be cleared
+            slot = card_slots[id(pending["card"])] = message.empty()
+            render_shop(slot.container(), pending["card"])
+            if pending["card"].get("photo_ref"):
+                # Keep the photo's place in the card until it is resolved
+                photo_slots[id(pending["card"])] = message.empty()
+        elif pending["type"] == "photo":
+            photo_url = pending["card"]["photo_url"]
+            slot = photo_slots.pop(id(pending["card"]), None)
+            if slot is not None and photo_url and photo_url != "NOT_FOUND":
+                slot.image(photo_url, caption="The photo of the coffee shop.")
+        elif pending["type"] == "retract":
+            for card in pending["cards"]:
+                slot = card_slots.pop(id(card), None)
+                if slot is not None:
+                    slot.empty()
+        elif pending["type"] == "done":
+            status.empty()
+            return pending
+        pending = next(events, None)
+
+def render_turn(user, ai, turn=None, show_timings=False):
+    """Render one finished turn: the user's prompt and the AI's cards."""
+    st.chat_message("human").write(user)
+    message = st.chat_message("ai")
+    render_shops(message, ai)
+    if show_timings and turn:
+        render_timings(message, turn)
+
+def render_history(end: int, show_timings=False):
+    """Render the finished turns before `end`, only the newest pages of them.
+
+    Long sessions would otherwise re-send every card and image of the conversation on each rerun.
+    """
+    pages = st.session_state.setdefault("history_pages", 1)
+    start = max(0, end - pages * HISTORY_PAGE_SIZE)
+    if start > 0 and st.button(f"Show earlier messages ({start} more)", type="tertiary", icon=":material/expand_less:"):
+        st.session_state["history_pages"] += 1
+        st.rerun()
+    for user, ai, turn in zip(
+        st.session_state["user_prompts"][start:end],
+        st.session_state["ai_responses"][start:end],
+        st.session_state["turn_timings"][start:end],
+    ):
+        render_turn(user, ai, turn, show_timings)
@@ -0,0 +1,119 @@
+import threading
+from dataclasses import dataclass
+import streamlit as st
+from langchain.agents import create_agent
+from langchain.agents.middleware import dynamic_prompt, ModelRequest
+from langchain.agents.structured_output import ToolStrategy
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_tavily import TavilySearch
+from answer_cache import AnswerCache
+from pipeline import prewarm_answers
+from prompts import AGENT_PROMPT, REPHRASE_PROMPT, ROUTING_PROMPT, SUMMARY_PROMPT, STARTER_QUESTIONS
+from router import LocalRouter
+from schema import ToolsToUse
+from telemetry import get_metrics, serve_metrics
+from tools import geocode_place, get_place_detail, find_places_by_text
+
+@dataclass
+class UserContext:
+    """Per-user values passed to the shared agents at call time."""
+    lat: float = 0.0
+    lng: float = 0.0
+
+@dynamic_prompt
+def location_prompt(request: ModelRequest) -> str:
+    """Fill the agent system prompt with the calling user's location."""
+    context = request.runtime.context or UserContext()
+    return AGENT_PROMPT.format(lat=context.lat, lng=context.lng)
+
+class ResourcePool:
+    """Builds the LLM client, prompt chains, tools and compiled agents once and shares them across sessions."""
+
+    def __init__(self, llm=None, tools=None, router=None, answer_cache=None):
+        self._llm = llm
+        self._tools = tools
+        self._router = router
+        self.answer_cache = answer_cache or AnswerCache()
+        self._rephraser_chain = None
+        self._routing_chain = None
+        self._summary_chain = None
+        self._agents = {}
+        self._lock = threading.RLock()
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash")
+        return self._llm
+
+    @property
+    def tools(self):
+        if self._tools is None:
+            with self._lock:
+                if self._tools is None:
+                    self._tools = [find_places_by_text, geocode_place, TavilySearch(), get_place_detail]
+        return self._tools
+
+    @property
+    def rephraser_chain(self):
+        if self._rephraser_chain is None:
+            with self._lock:
+                if self._rephraser_chain is None:
+                    self._rephraser_chain = REPHRASE_PROMPT | self.llm
+        return self._rephraser_chain
+
+    @property
+    def routing_chain(self):
+        if self._routing_chain is None:
+            with self._lock:
+                if self._routing_chain is None:
+                    self._routing_chain = ROUTING_PROMPT | self.llm.with_structured_output(ToolsToUse)
+        return self._routing_chain
+
+    @property
+    def summary_chain(self):
+        if self._summary_chain is None:
+            with self._lock:
+                if self._summary_chain is None:
+                    self._summary_chain = SUMMARY_PROMPT | self.llm
+        return self._summary_chain
+
+    @property
+    def router(self):
+        if self._router is None:
+            with self._lock:
+                if self._router is None:
+                    self._router = LocalRouter.from_path()
+        return self._router
+
+    def get_agent(self, response_format=None):
+        """Return the compiled agent for `response_format` (e.g. SearchResult or None), compiling it on first use.
+
+        Invoke it with `context=UserContext(lat, lng)` to supply the user's location.
+        """
+        agent = self._agents.get(response_format)
+        if agent is None:
+            with self._lock:
+                agent = self._agents.get(response_format)
+                if agent is None:
+                    agent = create_agent(
+                        model=self.llm,
+                        tools=self.tools,
+                        middleware=[location_prompt],
+                        # Structured answers come back as a tool call so their items can be streamed as they complete
+                        response_format=ToolStrategy(response_format) if response_format else None,
+                        context_schema=UserContext,
+                    )
+                    self._agents[response_format] = agent
+        return agent
+
+@st.cache_resource(show_spinner=False)
+def get_pool() -> ResourcePool:
+    """The resource pool shared by every session in this server process."""
+    pool = ResourcePool()
+    get_metrics().answer_cache = pool.answer_cache
+    serve_metrics()
+    threading.Thread(target=prewarm_answers, args=(pool, STARTER_QUESTIONS), name="prewarm", daemon=True).start()
+    return pool
@@ -0,0 +1,166 @@
+import json
+import math
+import os
+import re
+import sys
+import threading
+from collections import Counter, defaultdict
+
+# Router decisions below this confidence are handed to the LLM router
+CONFIDENCE_THRESHOLD = 0.9
+
+DEFAULT_MODEL_PATH = os.environ.get("ROUTER_MODEL_PATH", "router_model.json")
+DEFAULT_LOG_PATH = os.environ.get("ROUTER_LOG_PATH")
+
+# Only words that are about coffee on their own; "roast", "brew", "bean", "drip", "grind" or "extraction"
+# also come up in cooking, beer or gardening questions, which the LLM router has to tell apart
+_COFFEE = re.compile(
+    r"\b(coffee|coffees|kopi|espresso|espressos|latte|lattes|cappuccino|americano|macchiato|mocha|cortado|"
+    r"flat white|cold brew|arabica|robusta|pour[- ]over|french press|aeropress|moka pot|v60|chemex|crema|"
+    r"caffeine|decaf|barista|baristas)\b"
+)
+_SHOP = re.compile(r"\b(cafe|cafes|café|cafés|coffee ?shops?|coffeehouses?|roaster(y|ies|s)?|kedai kopi|warkop)\b")
+_PLACE_SEARCH = re.compile(
+    r"\b(near|nearby|nearest|around|close to|recommend|recommendations?|find|where|best|top)\b"
+)
+# The locating words of _PLACE_SEARCH; "best", "top" and "recommend" are just as common in brewing questions
+_LOCATING = re.compile(r"\b(near|nearby|nearest|around|close to|where|find)\b")
+_NEAR_ME = re.compile(r"\b(near me|nearby|around me|around here|close to me|closest)\b")
+_TRENDING = re.compile(
+    r"\b(latest|newest|recent|recently|trend|trends|trending|news|update|updates|current|currently|"
+    r"this year|today|market price|prices? of|20\d\d)\b"
+)
+_DETAIL = re.compile(r"\b(opening hours|open now|hours|phone|menu|seating|wifi|parking|reservation|price range)\b")
+# A capitalised place name after a locating preposition, e.g. "near Grand Indonesia", "in Jakarta Selatan"
+_NAMED_PLACE = re.compile(r"\b(?:near|around|in|at|close to) ((?:[A-Z][\w'.-]*)(?: (?:[A-Z][\w'.-]*|\d+))*)")
+_KNOWLEDGE = re.compile(r"\b(what|why|how|difference|differences|explain|tips?|which|is|are|does|should|can)\b")
+
+def tokenize(text: str):
+    """Lowercased words plus adjacent-word bigrams."""
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+def named_place(question: str):
+    """The place name the question is located at, e.g. "Blok M" in "cafes near Blok M", or None."""
+    match = _NAMED_PLACE.search(question)
+    return match.group(1) if match else None
+
+def rule_route(question: str):
+    """Keyword rules for the unambiguous cases. Returns (label, confidence) or (None, 0.0)."""
+    text = question.lower()
+    shop = bool(_SHOP.search(text))
+    trending = bool(_TRENDING.search(text))
+    detail = bool(_DETAIL.search(text))
+    # A coffee question asking where to go is a place search even without "cafe" or "shop" in it
+    locating = bool(_NEAR_ME.search(text) or _LOCATING.search(text)) or named_place(question) is not None
+
+    if shop and _NEAR_ME.search(text) and not trending and not detail:
+        return "find_places_by_text", 0.97
+    if trending and _COFFEE.search(text) and not shop:
+        return "TavilySearch", 0.92
+    if shop and _PLACE_SEARCH.search(text) and not trending and not detail:
+        return "find_places_by_text", 0.92
+    if _COFFEE.search(text) and _KNOWLEDGE.search(text) and not (shop or trending or detail or locating):
+        return "no_tool", 0.93
+    return None, 0.0
+
+class NaiveBayesRouter:
+    """Multinomial naive Bayes over words and bigrams, trained from logged LLM routing decisions."""
+
+    def __init__(self, label_counts=None, token_counts=None):
+        self.label_counts = Counter(label_counts or {})
+        self.token_counts = {label: Counter(counts) for label, counts in (token_counts or {}).items()}
+        self._refresh()
+
+    def _refresh(self):
+        self.vocab_size = len({tok for counts in self.token_counts.values() for tok in counts}) or 1
+        self.totals = {label: sum(counts.values()) for label, counts in self.token_counts.items()}
+        self.docs = sum(self.label_counts.values())
+
+    @classmethod
+    def train(cls, examples):
+        """Train from an iterable of (question, label) pairs."""
+        label_counts = Counter()
+        token_counts = defaultdict(Counter)
+        for question, label in examples:
+            label_counts[label] += 1
+            token_counts[label].update(tokenize(question))
+        return cls(label_counts, token_counts)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["label_counts"], data["token_counts"])
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"label_counts": self.label_counts, "token_counts": self.token_counts}, f)
+
+    def predict(self, question: str):
+        """Return (label, posterior probability) or (None, 0.0) when the model is empty."""
+        if not self.docs:
+            return None, 0.0
+        tokens = tokenize(question)
+        scores = {}
+        for label, count in self.label_counts.items():
+            counts = self.token_counts.get(label, {})
+            denominator = self.totals.get(label, 0) + self.vocab_size
+            score = math.log(count / self.docs)
+            for tok in tokens:
+                score += math.log((counts.get(tok, 0) + 1) / denominator)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        # Softmax over the log scores gives the posterior of the best label
+        total = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / total
+
+class LocalRouter:
+    """In-process classifier for `ToolsToUse.final_tool_to_use` labels.
+
+    Decides only when confident; `route` returns None so the caller can fall back to the LLM router.
+    """
+
+    def __init__(self, model: NaiveBayesRouter = None, threshold: float = CONFIDENCE_THRESHOLD, log_path: str = DEFAULT_LOG_PATH):
+        self.model = model
+        self.threshold = threshold
+        self.log_path = log_path
+        self._log_lock = threading.Lock()
+
+    @classmethod
+    def from_path(cls, model_path: str = DEFAULT_MODEL_PATH, **kwargs):
+        """Load the trained model if present; rules alone are used otherwise."""
+        model = NaiveBayesRouter.load(model_path) if model_path and os.path.exists(model_path) else None
+        return cls(model, **kwargs)
+
+    def classify(self, question: str):
+        label, confidence = rule_route(question)
+        if label is None and self.model is not None:
+            label, confidence = self.model.predict(question)
+        return label, confidence
+
+    def route(self, question: str):
+        label, confidence = self.classify(question)
+        return label if confidence >= self.threshold else None
+
+    def log_decision(self, question: str, label: str):
+        """Append an LLM routing decision to the training log, if logging is enabled."""
+        if not self.log_path:
+            return
+        with self._log_lock, open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"question": question, "label": label}, ensure_ascii=False) + "\n")
+
+def read_log(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record["question"], record["label"]
+
+if __name__ == "__main__":
+    # Usage: python router.py <routing_log.jsonl> [router_model.json]
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python router.py <routing_log.jsonl> [router_model.json]")
+    model = NaiveBayesRouter.train(read_log(sys.argv[1]))
+    model.save(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_MODEL_PATH)
+    print(f"Trained on {model.docs} prompts: {dict(model.label_counts)}")
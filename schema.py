@@ -5,14 +5,6 @@ class ToolsToUse(BaseModel):
     """Schema for AI model to decide the correct final tool to use for answering the user question."""
     final_tool_to_use: Literal["find_places_by_text", "geocode_place", "get_place_detail", "TavilySearch", "no_tool", "not_related"] = Field(description="The final apropriate tool to use for answering the user question.")
 
-class PlacesNearby(BaseModel):
-    """Schema required to format the AI responses when find_places_nearby tool is called."""
-    names: List[str] = Field(description="The name of coffee shops/cafes available nearby.")
-    addresses: List[str] = Field(description="The address of coffee shops/cafes available nearby.")
-    ratings: List[str] = Field(description="The rating of coffee shops/cafes available nearby.")
-    google_map_links: List[str] = Field(description="The google map link of coffee shops/cafes available nearby.")
-    photos: List[str] = Field(description="The photo name of coffee shops/cafes available nearby.")
-
 class SearchResultItem(BaseModel):
     text: str = Field(description="""
     Write a detailed multi-sentence explanation (at least 4–6 sentences)
@@ -23,4 +15,27 @@ class SearchResultItem(BaseModel):
 
 class SearchResult(BaseModel):
     """Schema required to format the AI responses when TavilySearch tool is called."""
-    results: List[SearchResultItem] = Field(description="List of text content in search results, each paired with its own source link.")
\ No newline at end of file
+    results: List[SearchResultItem] = Field(description="List of text content in search results, each paired with its own source link.")
+
+class PlaceSummary(BaseModel):
+    """Compact view of a Places text-search result; the raw place stays in the tool artifact."""
+    place_id: str = Field(description="Place ID to pass to get_place_detail.")
+    name: str
+    address: str | None = None
+    rating: float | None = None
+    maps_uri: str | None = None
+    photo_ref: str | None = None
+
+class PlaceDetailSummary(BaseModel):
+    """Compact view of a Place Details response; the raw response stays in the tool artifact."""
+    place_id: str
+    address: str | None = None
+    phone: str | None = None
+    rating: float | None = None
+    price_range: str | None = None
+    open_now: bool | None = None
+    hours: str | None = Field(default=None, description="Opening hours with days that share hours grouped, e.g. 'Monday–Friday: 7:00 AM – 10:00 PM'.")
+    dine_in: bool | None = None
+    delivery: bool | None = None
+    outdoor_seating: bool | None = None
+    review_summary: str | None = None
@@ -0,0 +1,153 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from cache import count_lookup
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Precision 6 cells are about 1.2 km x 0.6 km
+CELL_PRECISION = 6
+
+# How long a text search keeps its cell "covered" before the API is asked again
+COVERAGE_TTL = float(os.environ.get("SPATIAL_COVERAGE_TTL", 3600))
+
+# A search answers later searches centred within this many metres of it
+COVERAGE_RADIUS = 500
+
+# Serve from the index only when it can fill a reasonable result list
+MIN_RESULTS = 3
+MAX_RESULTS = 5
+MAX_PLACES = 50000
+
+EARTH_RADIUS_M = 6371000.0
+
+def geohash(lat: float, lng: float, precision: int = CELL_PRECISION) -> str:
+    """Standard base32 geohash of a coordinate."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+def _cell_size(precision: int):
+    """(lat degrees, lng degrees) spanned by one cell."""
+    lng_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+def distance_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Haversine distance in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+def cells_in_radius(lat: float, lng: float, radius: float, precision: int = CELL_PRECISION):
+    """Geohash cells overlapping the bounding box of a circle."""
+    d_lat = math.degrees(radius / EARTH_RADIUS_M)
+    d_lng = math.degrees(radius / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 0.01)))
+    cell_lat, cell_lng = _cell_size(precision)
+    # Stepping by one cell from the bbox corner visits every row and column of cells
+    lats = [lat - d_lat + i * cell_lat for i in range(int(2 * d_lat / cell_lat) + 1)] + [lat + d_lat]
+    lngs = [lng - d_lng + j * cell_lng for j in range(int(2 * d_lng / cell_lng) + 1)] + [lng + d_lng]
+    return {
+        geohash(min(max(cell_point_lat, -90.0), 90.0), min(max(cell_point_lng, -180.0), 180.0), precision)
+        for cell_point_lat in lats
+        for cell_point_lng in lngs
+    }
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+class PlaceIndex:
+    """In-memory geohash grid of every place returned by text searches.
+
+    A search marks the cells around its centre as covered for its query; later searches for
+    the same query centred in a fresh covered cell are answered from the grid instead of the
+    Places API.
+    """
+
+    def __init__(self, coverage_ttl: float = COVERAGE_TTL, max_places: int = MAX_PLACES):
+        self.coverage_ttl = coverage_ttl
+        self.max_places = max_places
+        self._places = OrderedDict()  # place id -> entry, least recently seen first
+        self._cells = {}  # geohash -> set of place ids
+        self._coverage = {}  # (query, geohash) -> time of the covering search
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def add(self, query: str, lat: float, lng: float, radius: float, places):
+        """Record the places returned by a text search centred on (lat, lng)."""
+        query = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            for place in places:
+                location = place.get("location")
+                place_id = place.get("id")
+                if not location or not place_id:
+                    continue
+                entry = self._places.pop(place_id, None) or {"queries": set()}
+                entry.update(place=place, lat=location["latitude"], lng=location["longitude"], seen_at=now)
+                entry["queries"].add(query)
+                self._places[place_id] = entry
+                self._cells.setdefault(geohash(entry["lat"], entry["lng"]), set()).add(place_id)
+            for cell in cells_in_radius(lat, lng, min(radius, COVERAGE_RADIUS)):
+                self._coverage[(query, cell)] = now
+            if len(self._coverage) > self.max_places:
+                self._coverage = {k: t for k, t in self._coverage.items() if now - t <= self.coverage_ttl}
+            while len(self._places) > self.max_places:
+                place_id, entry = self._places.popitem(last=False)
+                self._cells.get(geohash(entry["lat"], entry["lng"]), set()).discard(place_id)
+
+    def lookup(self, query: str, lat: float, lng: float, radius: float):
+        """Places for `query` within `radius` metres, or None if the area isn't freshly covered."""
+        query = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            covered_at = self._coverage.get((query, geohash(lat, lng)))
+            if covered_at is None or now - covered_at > self.coverage_ttl:
+                self.misses += 1
+                count_lookup("spatial", "search_text", False)
+                return None
+            matches = []
+            for cell in cells_in_radius(lat, lng, radius):
+                for place_id in self._cells.get(cell, ()):
+                    entry = self._places[place_id]
+                    if now - entry["seen_at"] > self.coverage_ttl:
+                        continue
+                    name = entry["place"].get("displayName", {}).get("text", "").lower()
+                    if query not in entry["queries"] and query not in name:
+                        continue
+                    distance = distance_m(lat, lng, entry["lat"], entry["lng"])
+                    if distance <= radius:
+                        matches.append((distance, entry["place"]))
+            if len(matches) < MIN_RESULTS:
+                self.misses += 1
+                count_lookup("spatial", "search_text", False)
+                return None
+            self.hits += 1
+        count_lookup("spatial", "search_text", True)
+        matches.sort(key=lambda match: match[0])
+        return [place for _, place in matches[:MAX_RESULTS]]
+
+_index = PlaceIndex()
+
+def get_index() -> PlaceIndex:
+    """The place index shared by every session in this process."""
+    return _index
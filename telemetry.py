@@ -0,0 +1,272 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import ToolMessage
+from cache import get_cache, turn_lookups
+from spatial import get_index
+
+# Named runs of a turn (see pipeline.py); nested LangChain runs are ignored unless they are tools or LLM calls
+STAGES = ("rephrase", "route", "agent", "summary")
+
+# Histogram buckets in seconds, from a cache hit to a slow agent loop
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRICS_PORT = os.environ.get("METRICS_PORT")
+TRACE_LOG_PATH = os.environ.get("TRACE_LOG_PATH")
+
+def cache_counts(answer_cache=None) -> Counter:
+    """Process-wide cache hit and miss counts keyed by (cache, endpoint, "hit" | "miss")."""
+    counts = Counter()
+    disk = get_cache()
+    for endpoint, hits in disk.hits.items():
+        counts[("disk", endpoint, "hit")] = hits
+    for endpoint, misses in disk.misses.items():
+        counts[("disk", endpoint, "miss")] = misses
+    index = get_index()
+    counts[("spatial", "search_text", "hit")] = index.hits
+    counts[("spatial", "search_text", "miss")] = index.misses
+    if answer_cache is not None:
+        counts[("answer", "no_tool", "hit")] = answer_cache.hits
+        counts[("answer", "no_tool", "miss")] = answer_cache.misses
+    return counts
+
+def _is_tool_error(output) -> bool:
+    # Tools built with handle_tool_error return their failures as an error ToolMessage
+    return isinstance(output, ToolMessage) and output.status == "error"
+
+class Metrics:
+    """Process-wide latency histograms and counters, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}  # stage -> [bucket counts..., sum, count]
+        self._errors = Counter()
+        self._tokens = Counter()
+        self._turns = Counter()
+        self.answer_cache = None
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, error: bool = False):
+        with self._lock:
+            histogram = self._histograms.setdefault(stage, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+            if error:
+                self._errors[stage] += 1
+
+    def record_turn(self, turn: dict):
+        """Fold a finished turn (see `TurnTracer.finish`) into the counters and histograms."""
+        for span in turn["spans"]:
+            self.observe(span["name"], span["duration_ms"] / 1000, span["error"])
+        self.observe("turn", turn["total_ms"] / 1000)
+        with self._lock:
+            self._turns[turn.get("route") or "unknown"] += 1
+            for direction in ("input", "output"):
+                self._tokens[direction] += turn["tokens"][direction]
+
+    def render(self) -> str:
+        lines = [
+            "# HELP coffeegpt_stage_seconds Latency of each stage of a chat turn.",
+            "# TYPE coffeegpt_stage_seconds histogram",
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                for bound, count in zip(self.buckets, histogram):
+                    lines.append(f'coffeegpt_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'coffeegpt_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram[-1]}')
+                lines.append(f'coffeegpt_stage_seconds_sum{{stage="{stage}"}} {histogram[-2]:.6f}')
+                lines.append(f'coffeegpt_stage_seconds_count{{stage="{stage}"}} {histogram[-1]}')
+            lines += ["# HELP coffeegpt_stage_errors_total Stages and tool calls that failed.",
+                      "# TYPE coffeegpt_stage_errors_total counter"]
+            lines += [f'coffeegpt_stage_errors_total{{stage="{stage}"}} {count}' for stage, count in sorted(self._errors.items())]
+            lines += ["# HELP coffeegpt_tokens_total LLM tokens used by chat turns.",
+                      "# TYPE coffeegpt_tokens_total counter"]
+            lines += [f'coffeegpt_tokens_total{{direction="{d}"}} {count}' for d, count in sorted(self._tokens.items())]
+            lines += ["# HELP coffeegpt_turns_total Chat turns answered, by route.",
+                      "# TYPE coffeegpt_turns_total counter"]
+            lines += [f'coffeegpt_turns_total{{route="{route}"}} {count}' for route, count in sorted(self._turns.items())]
+        lines += ["# HELP coffeegpt_cache_requests_total Cache lookups by cache, endpoint and result.",
+                  "# TYPE coffeegpt_cache_requests_total counter"]
+        lines += [
+            f'coffeegpt_cache_requests_total{{cache="{cache}",endpoint="{endpoint}",result="{result}"}} {count}'
+            for (cache, endpoint, result), count in sorted(cache_counts(self.answer_cache).items())
+        ]
+        return "\n".join(lines) + "\n"
+
+class TurnTracer(BaseCallbackHandler):
+    """Records the timing spans, token usage, tool calls and cache hits of one chat turn.
+
+    Pass it in `config["callbacks"]` to the pipeline functions; stages outside LangChain
+    (e.g. photo resolution) are added with `add_span`. Call `finish` once the turn is over.
+    Cache lookups are counted for the context the tracer is created in (and copies of it), so
+    turns running concurrently in other threads don't show up in each other's counts.
+    """
+
+    def __init__(self, metrics: "Metrics" = None):
+        self.metrics = metrics
+        self.spans = []
+        self.tokens = Counter(input=0, output=0)
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.tool_errors = 0
+        self.started = time.perf_counter()
+        self._open = {}
+        self.caches = Counter()
+        turn_lookups.set(self.caches)
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, started: float, ended: float = None, error: bool = False):
+        """Record a span from perf_counter timestamps."""
+        ended = time.perf_counter() if ended is None else ended
+        with self._lock:
+            self.spans.append({
+                "name": name,
+                "start_ms": round((started - self.started) * 1000, 1),
+                "duration_ms": round((ended - started) * 1000, 1),
+                "error": error,
+            })
+
+    def _start(self, run_id, name: str):
+        with self._lock:
+            self._open[run_id] = (name, time.perf_counter())
+
+    def _end(self, run_id, error: bool = False):
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+        if opened:
+            self.add_span(opened[0], opened[1], error=error)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, name=None, **kwargs):
+        if name in STAGES:
+            self._start(run_id, name)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=True)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, name=None, **kwargs):
+        with self._lock:
+            self.tool_calls += 1
+        self._start(run_id, f"tool:{(serialized or {}).get('name') or name}")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        error = _is_tool_error(output)
+        if error:
+            with self._lock:
+                self.tool_errors += 1
+        self._end(run_id, error=error)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self.tool_errors += 1
+        self._end(run_id, error=True)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self._lock:
+            self.llm_calls += 1
+        self._start(run_id, "llm")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                with self._lock:
+                    self.tokens["input"] += usage.get("input_tokens", 0)
+                    self.tokens["output"] += usage.get("output_tokens", 0)
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=True)
+
+    def finish(self, route: str = None) -> dict:
+        """Close the turn, record it in `metrics` and the trace log, and return its summary."""
+        if turn_lookups.get() is self.caches:
+            turn_lookups.set(None)
+        turn = {
+            "time": time.time(),
+            "route": route,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "spans": list(self.spans),
+            "tokens": dict(self.tokens),
+            "llm_calls": self.llm_calls,
+            "tool_calls": self.tool_calls,
+            "tool_errors": self.tool_errors,
+            "cache": {f"{cache}:{endpoint}:{result}": count for (cache, endpoint, result), count in sorted(self.caches.items())},
+        }
+        if self.metrics is not None:
+            self.metrics.record_turn(turn)
+        log_turn(turn)
+        return turn
+
+def breakdown(turn: dict) -> dict:
+    """Total milliseconds per span name of a finished turn, in the order the stages first started."""
+    totals = {}
+    for span in sorted(turn["spans"], key=lambda span: span["start_ms"]):
+        totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration_ms"]
+    return totals
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile of `values`."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))]
+
+def find_tracer(config):
+    """The TurnTracer among `config["callbacks"]`, if any."""
+    for handler in (config or {}).get("callbacks") or []:
+        if isinstance(handler, TurnTracer):
+            return handler
+    return None
+
+_log_lock = threading.Lock()
+
+def log_turn(turn: dict, path: str = TRACE_LOG_PATH):
+    """Append a finished turn to the structured trace log, if logging is enabled."""
+    if not path:
+        return
+    with _log_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(turn, ensure_ascii=False) + "\n")
+
+_metrics = Metrics()
+_server = None
+_server_lock = threading.Lock()
+
+def get_metrics() -> Metrics:
+    """The metrics registry shared by every session in this process."""
+    return _metrics
+
+def serve_metrics(port=METRICS_PORT, host: str = "0.0.0.0"):
+    """Serve `get_metrics()` at http://host:port/metrics in a background thread, once per process."""
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            class Handler(BaseHTTPRequestHandler):
+                def log_message(self, format, *args):
+                    pass
+
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = _metrics.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            _server = ThreadingHTTPServer((host, int(port)), Handler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
@@ -1,18 +1,40 @@
-import requests
 import os
+import json
+import httpx
 from dotenv import load_dotenv
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool, ToolException
+import transport
+from cache import get_cache, make_key
+from ratelimit import RateLimitExceeded, SingleFlight, get_bucket
+from schema import PlaceDetailSummary, PlaceSummary
+from spatial import get_index
 
 load_dotenv()
 
-@tool
-def find_places_by_text(query: str, lat: float = None, lng: float = None, radius: int = 3000):
-    """Find places using text search with Google Places API, with optional location bias."""
-    url = "https://places.googleapis.com/v1/places:searchText"
+# Identical lookups from concurrent sessions share one upstream request, keyed by their cache key
+_flights = SingleFlight()
+
+def google_bucket():
+    """The request budget of the configured Google API key."""
+    return get_bucket(os.environ["GPLACES_API_KEY"])
+
+def _upstream_error(api: str, response: httpx.Response = None, error: Exception = None) -> ToolException:
+    """A short, model-readable failure instead of the raw upstream payload."""
+    if isinstance(error, RateLimitExceeded) or (response is not None and response.status_code == 429):
+        return ToolException(f"The {api} is over its request quota right now. Try again in a moment.")
+    if error is not None:
+        return ToolException(f"The {api} could not be reached.")
+    try:
+        message = response.json().get("error", {}).get("message")
+    except ValueError:
+        message = None
+    return ToolException(f"The {api} request failed ({response.status_code}): {message or response.reason_phrase}")
+
+def _search_text_request(query: str, lat: float = None, lng: float = None, radius: int = 3000):
     headers = {
         "Content-Type": "application/json",
         "X-Goog-Api-Key": os.environ["GPLACES_API_KEY"],
-        "X-Goog-FieldMask": "places.displayName,places.formattedAddress,places.rating,places.googleMapsLinks,places.photos",
+        "X-Goog-FieldMask": "places.id,places.location,places.displayName,places.formattedAddress,places.rating,places.googleMapsLinks,places.photos",
     }
 
     # Always include the query
@@ -30,41 +52,252 @@ def find_places_by_text(query: str, lat: float = None, lng: float = None, radius
             }
         }
 
-    response = requests.post(url, headers=headers, json=payload)
-    data = response.json()
+    return {
+        "method": "POST",
+        "url": f"{transport.PLACES_BASE_URL}/places:searchText",
+        "headers": headers,
+        "json": payload,
+        "bucket": google_bucket(),
+    }
 
-    if "places" not in data:
-        return f"Error: {data}"
+def _parse_places(response: httpx.Response):
+    if response.status_code != 200:
+        raise _upstream_error("Places API", response)
 
-    return data["places"]
+    # Places answers an empty object when nothing matched
+    return response.json().get("places", [])
 
-@tool
-def geocode_place(place_name: str):
-    """Get latitude and longitude for a place name using Google Geocoding API."""
-    url = f"https://maps.googleapis.com/maps/api/geocode/json?address={place_name}&key={os.environ['GPLACES_API_KEY']}"
-    response = requests.get(url)
-    data = response.json()
+def project_place(place: dict) -> dict:
+    """The fields of a raw Places result the agent needs to talk about it."""
+    photos = place.get("photos") or []
+    return PlaceSummary(
+        place_id=place.get("id", ""),
+        name=place.get("displayName", {}).get("text", "Unknown"),
+        address=place.get("formattedAddress"),
+        rating=place.get("rating"),
+        maps_uri=place.get("googleMapsLinks", {}).get("placeUri"),
+        photo_ref=photos[0]["name"] if photos else None,
+    ).model_dump(exclude_none=True)
+
+def summarize_hours(weekday_descriptions) -> str:
+    """Join "Monday: 7:00 AM – 10:00 PM" style lines, grouping consecutive days with the same hours."""
+    groups = []  # [first day, last day, hours]
+    for line in weekday_descriptions or []:
+        day, _, hours = line.partition(": ")
+        if groups and groups[-1][2] == hours:
+            groups[-1][1] = day
+        else:
+            groups.append([day, day, hours])
+    if len(groups) == 1 and len(weekday_descriptions) == 7:
+        return f"Daily: {groups[0][2]}"
+    return "; ".join(f"{first}–{last}: {hours}" if first != last else f"{first}: {hours}" for first, last, hours in groups)
+
+def _format_price_range(price_range: dict):
+    if not price_range:
+        return None
+    start, end = price_range.get("startPrice", {}), price_range.get("endPrice", {})
+    currency = start.get("currencyCode") or end.get("currencyCode") or ""
+    if end.get("units"):
+        return f"{currency} {start.get('units', '0')}–{end['units']}".strip()
+    return f"{currency} {start.get('units', '0')}+".strip()
+
+def project_place_detail(placeId: str, data: dict) -> dict:
+    """The fields of a raw Place Details response the agent needs to answer about the cafe."""
+    hours = data.get("currentOpeningHours") or data.get("regularOpeningHours") or {}
+    return PlaceDetailSummary(
+        place_id=placeId,
+        address=data.get("formattedAddress"),
+        phone=data.get("nationalPhoneNumber"),
+        rating=data.get("rating"),
+        price_range=_format_price_range(data.get("priceRange")),
+        open_now=hours.get("openNow"),
+        hours=summarize_hours(hours.get("weekdayDescriptions")) or None,
+        dine_in=data.get("dineIn"),
+        delivery=data.get("delivery"),
+        outdoor_seating=data.get("outdoorSeating"),
+        review_summary=data.get("reviewSummary", {}).get("text", {}).get("text"),
+    ).model_dump(exclude_none=True)
+
+def _places_result(places):
+    # The model only sees the compact projection; the raw places stay in the artifact for the shop cards
+    return json.dumps([project_place(place) for place in places], ensure_ascii=False), places
+
+def _place_detail_result(placeId: str, data: dict):
+    return json.dumps(project_place_detail(placeId, data), ensure_ascii=False), data
+
+def _remember_places(query: str, lat: float, lng: float, radius: int, key: str, places, cached: bool):
+    if not cached:
+        get_cache().set("search_text", key, places)
+    if lat is not None and lng is not None:
+        get_index().add(query, lat, lng, radius, places)
+    return _places_result(places)
+
+def _indexed_places(query: str, lat: float, lng: float, radius: int):
+    """Places served from the spatial index when another search freshly covered this area."""
+    if lat is None or lng is None:
+        return None
+    return get_index().lookup(query, lat, lng, radius)
+
+def _fetch_places(query: str, lat: float, lng: float, radius: int, key: str):
+    try:
+        response = transport.request(**_search_text_request(query, lat, lng, radius))
+    except (httpx.HTTPError, RateLimitExceeded) as e:
+        raise _upstream_error("Places API", error=e)
+    places = _parse_places(response)
+    _remember_places(query, lat, lng, radius, key, places, cached=False)
+    return places
+
+async def _afetch_places(query: str, lat: float, lng: float, radius: int, key: str):
+    try:
+        response = await transport.arequest(**_search_text_request(query, lat, lng, radius))
+    except (httpx.HTTPError, RateLimitExceeded) as e:
+        raise _upstream_error("Places API", error=e)
+    places = _parse_places(response)
+    _remember_places(query, lat, lng, radius, key, places, cached=False)
+    return places
+
+def _find_places_by_text(query: str, lat: float = None, lng: float = None, radius: int = 3000):
+    """Find places using text search with Google Places API, with optional location bias."""
+    key = make_key("search_text", query=query, lat=lat, lng=lng, radius=radius)
+    places = _indexed_places(query, lat, lng, radius)
+    if places is not None:
+        return _places_result(places)
+    places = get_cache().get("search_text", key)
+    if places is not None:
+        return _remember_places(query, lat, lng, radius, key, places, cached=True)
+    return _places_result(_flights.do(key, lambda: _fetch_places(query, lat, lng, radius, key)))
+
+async def _afind_places_by_text(query: str, lat: float = None, lng: float = None, radius: int = 3000):
+    key = make_key("search_text", query=query, lat=lat, lng=lng, radius=radius)
+    places = _indexed_places(query, lat, lng, radius)
+    if places is not None:
+        return _places_result(places)
+    places = get_cache().get("search_text", key)
+    if places is not None:
+        return _remember_places(query, lat, lng, radius, key, places, cached=True)
+    return _places_result(await _flights.ado(key, lambda: _afetch_places(query, lat, lng, radius, key)))
 
-    if data["status"] != "OK" or not data["results"]:
-        return f"Could not find location for '{place_name}'."
+find_places_by_text = StructuredTool.from_function(
+    func=_find_places_by_text,
+    coroutine=_afind_places_by_text,
+    name="find_places_by_text",
+    response_format="content_and_artifact",
+    # Upstream failures reach the model as a short error message instead of raising
+    handle_tool_error=True,
+)
+
+def _geocode_request(place_name: str):
+    params = {"address": place_name, "key": os.environ["GPLACES_API_KEY"]}
+    return {"method": "GET", "url": transport.GEOCODE_URL, "params": params, "bucket": google_bucket()}
+
+def _parse_geocode(response: httpx.Response, place_name: str, key: str):
+    if response.status_code != 200:
+        raise _upstream_error("Geocoding API", response)
+
+    data = response.json()
+    if data["status"] == "ZERO_RESULTS" or (data["status"] == "OK" and not data["results"]):
+        raise ToolException(f"Could not find location for '{place_name}'.")
+    if data["status"] == "OVER_QUERY_LIMIT":
+        raise _upstream_error("Geocoding API", error=RateLimitExceeded(data["status"]))
+    if data["status"] != "OK":
+        raise ToolException(f"The Geocoding API request failed ({data['status']}).")
 
     location = data["results"][0]["geometry"]["location"]
     placeId = data["results"][0]["place_id"]
-    return {"lat": location["lat"], "lng": location["lng"], "placeId": placeId}
+    result = {"lat": location["lat"], "lng": location["lng"], "placeId": placeId}
+    get_cache().set("geocode", key, result)
+    return result
 
-@tool
-def get_place_detail(placeId: str):
-    """Get detailed information about a place using Google Places API."""
-    url = f"https://places.googleapis.com/v1/places/{placeId}"
+def _fetch_geocode(place_name: str, key: str):
+    try:
+        response = transport.request(**_geocode_request(place_name))
+    except (httpx.HTTPError, RateLimitExceeded) as e:
+        raise _upstream_error("Geocoding API", error=e)
+    return _parse_geocode(response, place_name, key)
+
+async def _afetch_geocode(place_name: str, key: str):
+    try:
+        response = await transport.arequest(**_geocode_request(place_name))
+    except (httpx.HTTPError, RateLimitExceeded) as e:
+        raise _upstream_error("Geocoding API", error=e)
+    return _parse_geocode(response, place_name, key)
+
+def _geocode_place(place_name: str):
+    """Get latitude and longitude for a place name using Google Geocoding API."""
+    key = make_key("geocode", query=place_name)
+    result = get_cache().get("geocode", key)
+    if result is not None:
+        return result
+    return _flights.do(key, lambda: _fetch_geocode(place_name, key))
+
+async def _ageocode_place(place_name: str):
+    key = make_key("geocode", query=place_name)
+    result = get_cache().get("geocode", key)
+    if result is not None:
+        return result
+    return await _flights.ado(key, lambda: _afetch_geocode(place_name, key))
+
+geocode_place = StructuredTool.from_function(
+    func=_geocode_place, coroutine=_ageocode_place, name="geocode_place", handle_tool_error=True
+)
+
+def _place_detail_request(placeId: str):
     headers = {
         "Content-Type": "application/json",
         "X-Goog-Api-Key": os.environ["GPLACES_API_KEY"],
         "X-Goog-FieldMask": "name,formattedAddress,currentOpeningHours,nationalPhoneNumber,priceRange,rating,delivery,dineIn,reviewSummary,outdoorSeating",
     }
-    response = requests.get(url, headers=headers)
-    data = response.json()
+    return {
+        "method": "GET",
+        "url": f"{transport.PLACES_BASE_URL}/places/{placeId}",
+        "headers": headers,
+        "bucket": google_bucket(),
+    }
 
+def _parse_place_detail(response: httpx.Response, placeId: str, key: str):
+    if response.status_code in (400, 404):
+        raise ToolException(f"No place found for placeId '{placeId}'.")
     if response.status_code != 200:
-        return f"Error retrieving details for placeId '{placeId}'"
+        raise _upstream_error("Places API", response)
+
+    data = response.json()
+    get_cache().set("place_detail", key, data)
+    return data
+
+def _fetch_place_detail(placeId: str, key: str):
+    try:
+        response = transport.request(**_place_detail_request(placeId))
+    except (httpx.HTTPError, RateLimitExceeded) as e:
+        raise _upstream_error("Places API", error=e)
+    return _parse_place_detail(response, placeId, key)
+
+async def _afetch_place_detail(placeId: str, key: str):
+    try:
+        response = await transport.arequest(**_place_detail_request(placeId))
+    except (httpx.HTTPError, RateLimitExceeded) as e:
+        raise _upstream_error("Places API", error=e)
+    return _parse_place_detail(response, placeId, key)
+
+def _get_place_detail(placeId: str):
+    """Get detailed information about a place using Google Places API."""
+    key = make_key("place_detail", placeId=placeId)
+    data = get_cache().get("place_detail", key)
+    if data is None:
+        data = _flights.do(key, lambda: _fetch_place_detail(placeId, key))
+    return _place_detail_result(placeId, data)
+
+async def _aget_place_detail(placeId: str):
+    key = make_key("place_detail", placeId=placeId)
+    data = get_cache().get("place_detail", key)
+    if data is None:
+        data = await _flights.ado(key, lambda: _afetch_place_detail(placeId, key))
+    return _place_detail_result(placeId, data)
 
-    return data
\ No newline at end of file
+get_place_detail = StructuredTool.from_function(
+    func=_get_place_detail,
+    coroutine=_aget_place_detail,
+    name="get_place_detail",
+    # The full response stays in the artifact; the model sees the compact projection
+    response_format="content_and_artifact",
+    handle_tool_error=True,
+)
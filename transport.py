@@ -0,0 +1,107 @@
+import asyncio
+import atexit
+import os
+import random
+import threading
+import time
+import weakref
+import httpx
+
+# Overridable so the tools can be pointed at local stand-ins (see benchmarks/)
+PLACES_BASE_URL = os.environ.get("PLACES_BASE_URL", "https://places.googleapis.com/v1")
+GEOCODE_URL = os.environ.get("GEOCODE_URL", "https://maps.googleapis.com/maps/api/geocode/json")
+
+# Google usually answers in well under a second; anything slower than this is a stuck call
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+DEFAULT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+
+# Quota and transient server errors are retried with full-jitter exponential backoff
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 2))
+BACKOFF_BASE = 0.25
+BACKOFF_MAX = 4.0
+
+# Only failures that happen before the request reached Google are safe and cheap to retry
+_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+_client = None
+_client_lock = threading.Lock()
+
+# httpx.AsyncClient pools are bound to the event loop that created them, so keep one per loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client() -> httpx.Client:
+    """Return the process-wide pooled HTTP client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(timeout=DEFAULT_TIMEOUT, limits=DEFAULT_LIMITS)
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the pooled async HTTP client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, limits=DEFAULT_LIMITS)
+        _async_clients[loop] = client
+    return client
+
+
+def retry_delay(attempt: int, response: httpx.Response = None) -> float:
+    """Seconds to wait before retry number `attempt` (from 0), honouring a numeric Retry-After."""
+    retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+    if retry_after.isdigit():
+        return min(float(retry_after), BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def request(method: str, url: str, timeout: float = None, retries: int = MAX_RETRIES, bucket=None, **kwargs) -> httpx.Response:
+    """Send a request through the shared client, retrying 429/5xx responses and connection failures.
+
+    `timeout` overrides the default for this call only. When a `bucket` (see ratelimit.py) is given,
+    every attempt first takes a token from it. The last response is returned even if it is an error.
+    """
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    for attempt in range(retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            response = get_client().request(method, url, **kwargs)
+        except _RETRY_ERRORS:
+            if attempt == retries:
+                raise
+            time.sleep(retry_delay(attempt))
+            continue
+        if response.status_code not in RETRY_STATUSES or attempt == retries:
+            return response
+        time.sleep(retry_delay(attempt, response))
+
+
+async def arequest(method: str, url: str, timeout: float = None, retries: int = MAX_RETRIES, bucket=None, **kwargs) -> httpx.Response:
+    """Async counterpart of `request`, sharing connections within the running event loop."""
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    for attempt in range(retries + 1):
+        if bucket is not None:
+            await bucket.aacquire()
+        try:
+            response = await get_async_client().request(method, url, **kwargs)
+        except _RETRY_ERRORS:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(retry_delay(attempt))
+            continue
+        if response.status_code not in RETRY_STATUSES or attempt == retries:
+            return response
+        await asyncio.sleep(retry_delay(attempt, response))
+
+
+@atexit.register
+def _close_client():
+    if _client is not None:
+        _client.close()